@@ -2,7 +2,8 @@
 Module that contains dynamics properties of a rational angle
 """
 from os import path
-from typing import Union
+from typing import Union, Iterable, Iterator
+from math import gcd
 
 import numpy as np
 from fractions import Fraction as Frac
@@ -341,3 +342,35 @@ class Angle:
             logger.error(f"{self}; Found a ConditionSet solution, might want to use a different method.")
             self.lam = 0.+0.j
         return self.lam
+
+
+def angles_with_denominators(dens:Iterable[int])->Iterator[tuple]:
+    """
+    Generates the rational angles in [0,1) with the given denominators,
+    in lowest terms.
+
+    The angles are yielded denominator by denominator (in the order given)
+    and by increasing numerator, so that sweeping `range(1,N+1)` lists every
+    rational angle with denominator up to N exactly once.
+
+    Parameters
+    ----------
+    dens: iterable of int
+        The denominators.
+
+    Return
+    ------
+    iterator of tuple
+        Pairs `(num, den)` with `gcd(num,den)==1`.
+
+    Example
+    -------
+    >>> list(angles_with_denominators([1,2,3]))
+    [(0, 1), (1, 2), (1, 3), (2, 3)]
+    """
+    for den in dens:
+        if type(den) is not int or den<1:
+            raise ValueError("The denominators should be positive integers")
+        for num in range(den):
+            if gcd(num,den)==1:
+                yield (num,den)
@@ -2,9 +2,11 @@
 Module that contains functions
 """
 from os import path
-from typing import Union
-from src.utils import nbhG, allsequences, non_escaping_sequences
-from src.angles import Angle
+from typing import Union, Iterable, NamedTuple
+from functools import lru_cache
+from math import gcd
+from src.utils import nbhG, allsequences, non_escaping_sequences, perron_root, NBH_BACKENDS
+from src.angles import Angle, angles_with_denominators
 
 from fractions import Fraction as Frac
 from numpy import array as nparray
@@ -13,9 +15,25 @@ from numpy import where as npwhere
 from numpy import append as npappend
 from numpy import flip as npflip
 from numpy import float64
+from numpy import ndarray
+from numpy import int64
+from numpy import nan as npnan
+from numpy import abs as npabs
+from numpy import arange as nparange
+from numpy import concatenate as npconcatenate
+from numpy import minimum as npminimum
+from numpy import maximum as npmaximum
+from numpy import triu_indices as nptriu_indices
+from numpy import fromiter as npfromiter
+from numpy import empty as npempty
+from numpy import argsort as npargsort
+from numpy import bincount as npbincount
+from numpy import cumsum as npcumsum
+from numpy.linalg import eigvals as npeigvals
 
 from scipy.sparse import csr_matrix
-from scipy.sparse.linalg import eigs
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigs, ArpackError, ArpackNoConvergence
 
 import logging
 import logging.config
@@ -27,8 +45,43 @@ logging.config.fileConfig(log_conf_path)
 # create logger
 logger = logging.getLogger("default")
 
+# below this number of vertices the wedge matrix is small enough for a dense solver
+_DENSE_LIMIT = 64
 
-def neighbor_graph(param:Union[int,float,complex], max_depth:int)->dict:
+# available solvers for the leading eigenvalue of the wedge
+EIGEN_METHODS = ('arpack','power','collatz')
+
+class PerronDiagnostics(NamedTuple):
+    """
+    Leading eigenvalue of the wedge transition matrix together with the
+    information on how it was computed.
+
+    Attributes
+    ----------
+    eigenvalue: float
+      The leading eigenvalue, i.e. the core entropy.
+    lower: float
+      Lower Collatz-Wielandt bound (nan for method 'arpack').
+    upper: float
+      Upper Collatz-Wielandt bound (nan for method 'arpack').
+    iterations: int
+      Number of iterations (0 for method 'arpack' and for the exact values).
+    converged: bool
+      Whether the solver reached the requested tolerance.
+    """
+    eigenvalue: float
+    lower: float
+    upper: float
+    iterations: int
+    converged: bool
+
+def _exact_diagnostics(value:float)->PerronDiagnostics:
+    """
+    Diagnostics for a value that is known exactly.
+    """
+    return PerronDiagnostics(value, value, value, 0, True)
+
+def neighbor_graph(param:Union[int,float,complex], max_depth:int, *, backend:str='sympy')->dict:
     """
     Creates the Neighbor Graph following NetworkX's graph data structure:
     a 'dictionary of dictionaries of dictionaries'. 
@@ -49,6 +102,9 @@ def neighbor_graph(param:Union[int,float,complex], max_depth:int)->dict:
       A number with absolute value less than 1.
     max_depth: int
       How long should the algorithm continue before exiting.
+    backend: str
+      Optional. 'sympy', 'numpy' or 'numba', see `src.utils.nbhG`. 
+      Default is 'sympy'.
     
     Returns
     -------
@@ -68,11 +124,14 @@ def neighbor_graph(param:Union[int,float,complex], max_depth:int)->dict:
     
     if type(max_depth) is not int:
         raise ValueError("The maximum depth should be an integer value")
+
+    if backend not in NBH_BACKENDS:
+        raise ValueError(f"backend should be one of {NBH_BACKENDS}")
     
     if abs(param)<0.5 or abs(abs(param)-1.0)<1e-13 or abs(param)>1:
         return {}
 
-    valid_nbh, nbh_lookup = nbhG(param,max_depth)
+    valid_nbh, nbh_lookup = nbhG(param,max_depth,backend=backend)
     nbh_graph = {}
     for nbh in valid_nbh:
         if nbh.word==".": 
@@ -94,11 +153,21 @@ def solomyak_alg(param:complex, depth:int=3)->list:
     results = non_escaping_sequences(param, seq_flip)
     return results
 
-def core_entropy(*,num:int=None, den:int=None, angle:Angle=None)->float64:
+def core_entropy(*,num:int=None, den:int=None, angle:Angle=None,
+                 method:str='arpack', tol:float=1e-12, max_iter:int=10000,
+                 diagnostics:bool=False)->Union[float64,PerronDiagnostics]:
     """
     Calculates the core entropy for a given rational angle.
     Choose between passing two integers (num and den) or an
     Angle element.
+
+    The leading eigenvalue of the wedge transition matrix can be computed with
+    - 'arpack': shift-invert ARPACK around 1.8 on the whole wedge. If it fails it returns 1.0.
+    - 'power': power iteration on the part of the wedge reachable from the 
+      critical value, it stops when the estimate is stable within `tol`.
+    - 'collatz': as 'power', but it stops when the Collatz-Wielandt lower and
+      upper bounds on the eigenvalue are within `tol` of each other.
+    The last two do not factorize the matrix and report whether they converged.
     
     Parameters
     ----------
@@ -108,13 +177,26 @@ def core_entropy(*,num:int=None, den:int=None, angle:Angle=None)->float64:
       The denominator of the rational angle.
     angle: Angle
       The rational angle as Angle type.
+    method: str
+      Optional. One of 'arpack', 'power' and 'collatz'. Default is 'arpack'.
+    tol: float
+      Optional. Relative tolerance for 'power' and 'collatz'. Default is 1e-12.
+    max_iter: int
+      Optional. Maximum number of iterations for 'power' and 'collatz'. Default is 10000.
+    diagnostics: bool
+      Optional. Whether to return the convergence diagnostics. Default is False.
     
     Returns
     -------
     numpy.float64
       The core entropy
+    PerronDiagnostics
+      If `diagnostics=True`, the core entropy together with the convergence information.
     """
 
+    if method not in EIGEN_METHODS:
+        raise ValueError(f"method should be one of {EIGEN_METHODS}")
+
     if num is not None and den is not None:
         if type(num) is not int or type(den) is not int:
             raise ValueError("Arguments should be integers or strings of integer")
@@ -130,9 +212,14 @@ def core_entropy(*,num:int=None, den:int=None, angle:Angle=None)->float64:
     thetaFr = theta.frac #represent it as a fraction
 
     if thetaFr==Frac(1,2):
-        return 2.0
+        return _exact_diagnostics(2.0) if diagnostics else 2.0
     if thetaFr==Frac(0,1) or thetaFr==Frac(1,1) :
-        return 1.0
+        return _exact_diagnostics(1.0) if diagnostics else 1.0
+
+    if method!='arpack':
+        result = _integer_core_entropy(thetaFr.numerator, thetaFr.denominator, method, tol, max_iter)
+        logger.debug(f"{theta}; {result}")
+        return result if diagnostics else result.eigenvalue
    
     #compute the orbit and find the period
     orb = theta.orbit()
@@ -231,14 +318,325 @@ def core_entropy(*,num:int=None, den:int=None, angle:Angle=None)->float64:
         # evals_small = eigs(adj_matrix,k=kE, sigma=0.00000001, which='LM',return_eigenvectors=False)
         # evals_mid = eigs(adj_matrix,k=kE, sigma=0.8999999, which='LM',return_eigenvectors=False)
         evals_large = eigs(adj_matrix,k=kE, sigma=1.7999999, which='LM',return_eigenvectors=False)
-    except:
-        return 1.0
+    except Exception as err:
+        logger.error(f"{theta}; ARPACK failed ({err!r}), returning 1.0. Try method='power' or method='collatz'.")
+        return PerronDiagnostics(1.0, npnan, npnan, 0, False) if diagnostics else 1.0
     else:
-        return max(set([x.real for x in evals_large if abs(x.imag)<.0001]))
+        entropy = max(set([x.real for x in evals_large if abs(x.imag)<.0001]))
+        return PerronDiagnostics(entropy, npnan, npnan, 0, True) if diagnostics else entropy
     # logger.debug(csr_matrix((data, indices, indptr), shape=(len(tuples),len(tuples))).toarray())
     # logger.debug(f"small evals using sparse {evals_small}")
     # logger.debug(f"mid evals using sparse {evals_mid}")
     # logger.debug(f"large evals using sparse {evals_large}")
     # logger.debug(f"largest real eval = {max(set([x.real for x in [*evals_small,*evals_mid,*evals_large] if abs(x.imag)<.0001]))}")
 
-    # return max(set([x.real for x in [*evals_small,*evals_mid,*evals_large] if abs(x.imag)<.0001]))
\ No newline at end of file
+    # return max(set([x.real for x in [*evals_small,*evals_mid,*evals_large] if abs(x.imag)<.0001]))
+
+
+def _orbit_numerators(num:int, den:int)->tuple:
+    """
+    Computes the orbit of num/den under the doubling map using only the numerators
+    modulo den.
+
+    Parameters
+    ----------
+    num: int
+      The numerator of the rational angle.
+    den: int
+      The denominator of the rational angle.
+
+    Returns
+    -------
+    tuple
+      The first entry is the numpy.ndarray of the distinct numerators of the orbit,
+      the second entry is the index of where the periodic part of the orbit starts.
+    """
+    first_seen = {}
+    orb = []
+    x = num % den
+    while x not in first_seen:
+        first_seen[x] = len(orb)
+        orb.append(x)
+        x = (2*x) % den
+    return npfromiter(orb, dtype=int64, count=len(orb)), first_seen[x]
+
+@lru_cache(maxsize=256)
+def _wedge_vertices(orbit_length:int)->tuple:
+    """
+    Vertex set of the wedge for an orbit with `orbit_length` distinct points.
+    The vertices are the pairs (i,j) with i<j, in lexicographic order, and 
+    the pair (i,j) has index `_wedge_index(i,j,orbit_length)`.
+
+    The result is cached and shared across angles, do not modify it.
+    """
+    return nptriu_indices(orbit_length, 1)
+
+def _wedge_index(i, j, orbit_length:int):
+    """
+    Position of the pair (i,j), with i<j, in the lexicographic order of the wedge vertex set.
+    """
+    return i*orbit_length - (i*(i+1))//2 + (j-i-1)
+
+def _wedge_matrix(num:int, den:int)->csr_matrix:
+    """
+    Builds the transition matrix of the wedge for the angle num/den using 
+    integer index arithmetic. It is the same matrix built in `core_entropy`.
+
+    Parameters
+    ----------
+    num: int
+      The numerator of the rational angle.
+    den: int
+      The denominator of the rational angle.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+      The adjacency matrix of the wedge.
+    """
+    orb, period_start = _orbit_numerators(num, den)
+    orbit_length = len(orb)
+    i, j = _wedge_vertices(orbit_length)
+    n_vertices = len(i)
+
+    #the angle x/den lies in [num/2den,(num+den)/2den) iff num <= 2x < num+den
+    side = (2*orb >= num) & (2*orb < num+den)
+    separated = side[i] != side[j]
+
+    #images of the orbit points, the last one goes back to the start of the period
+    i_next = i+1
+    j_next = j+1
+    j_next[j_next==orbit_length] = period_start
+
+    rows = nparange(n_vertices)
+
+    #a non-separated pair maps to the pair of images
+    not_sep = ~separated & (i_next!=j_next)
+    low = npminimum(i_next[not_sep], j_next[not_sep])
+    high = npmaximum(i_next[not_sep], j_next[not_sep])
+    all_rows = [rows[not_sep]]
+    all_cols = [_wedge_index(low, high, orbit_length)]
+
+    #a separated pair maps to the two pairs made of each image and the critical value
+    for target in (i_next, j_next):
+        sep = separated & (target!=0)
+        all_rows.append(rows[sep])
+        all_cols.append(_wedge_index(0, target[sep], orbit_length))
+
+    all_rows = npconcatenate(all_rows)
+    all_cols = npconcatenate(all_cols)
+    data = npones(len(all_rows), dtype='float64')
+    return csr_matrix((data, (all_rows, all_cols)), shape=(n_vertices, n_vertices))
+
+def _critical_wedge_matrix(num:int, den:int)->csr_matrix:
+    """
+    Builds the restriction of the wedge transition matrix to the vertices
+    that can be reached from the pairs containing the critical value, i.e. 
+    the first point of the orbit.
+
+    Every separated pair maps to pairs containing the critical value, so 
+    outside of this subgraph each vertex has at most one child and the 
+    spectral radius there is at most 1. 
+
+    Parameters
+    ----------
+    num: int
+      The numerator of the rational angle.
+    den: int
+      The denominator of the rational angle.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+      The adjacency matrix of the reachable part of the wedge.
+    """
+    orb, period_start = _orbit_numerators(num, den)
+    orbit_length = len(orb)
+    side = [num <= 2*x < num+den for x in orb.tolist()]
+
+    vertex_id = {(0,k):k-1 for k in range(1,orbit_length)}
+    stack = list(vertex_id)
+    rows = []
+    cols = []
+    while stack:
+        i, j = stack.pop()
+        i_next = i+1
+        j_next = j+1 if j+1<orbit_length else period_start
+        if side[i]==side[j]:
+            if i_next==j_next:
+                continue
+            targets = ((i_next,j_next) if i_next<j_next else (j_next,i_next),)
+        else:
+            targets = tuple((0,t) for t in (i_next,j_next) if t!=0)
+        row = vertex_id[(i,j)]
+        for target in targets:
+            if target not in vertex_id:
+                vertex_id[target] = len(vertex_id)
+                stack.append(target)
+            rows.append(row)
+            cols.append(vertex_id[target])
+
+    n_vertices = len(vertex_id)
+    data = npones(len(rows), dtype='float64')
+    return csr_matrix((data, (rows, cols)), shape=(n_vertices, n_vertices))
+
+def _perron_root_by_components(adj_matrix:csr_matrix, use_bounds:bool, tol:float, max_iter:int)->PerronDiagnostics:
+    """
+    Leading eigenvalue of a non-negative matrix as the maximum over its strongly
+    connected components. On each component the Perron root is simple, so the
+    power iteration converges geometrically.
+    """
+    n_comps, labels = connected_components(adj_matrix, directed=True, connection='strong')
+    if n_comps==1:
+        return PerronDiagnostics(*perron_root(adj_matrix.indptr, adj_matrix.indices, adj_matrix.data, tol, max_iter, use_bounds))
+    
+    #order the vertices by component, so that each component is a diagonal block
+    order = npargsort(labels, kind='stable')
+    ends = npcumsum(npbincount(labels))
+    block_matrix = adj_matrix[order][:, order].tocsr()
+    has_loop = block_matrix.diagonal()>0
+
+    result = _exact_diagnostics(0.0)
+    start = 0
+    for end in ends:
+        if end-start>1 or has_loop[start]:
+            block = block_matrix[start:end, start:end]
+            comp = PerronDiagnostics(*perron_root(block.indptr, block.indices, block.data, tol, max_iter, use_bounds))
+            result = PerronDiagnostics(max(result.eigenvalue, comp.eigenvalue),
+                                       max(result.lower, comp.lower),
+                                       max(result.upper, comp.upper),
+                                       result.iterations+comp.iterations,
+                                       result.converged and comp.converged)
+        start = end
+    return result
+
+def _leading_eigenvalue(adj_matrix:csr_matrix, method:str='arpack', tol:float=1e-12, max_iter:int=10000)->PerronDiagnostics:
+    """
+    Leading eigenvalue of the non-negative matrix `adj_matrix`, i.e. its spectral radius.
+
+    Parameters
+    ----------
+    adj_matrix: scipy.sparse.csr_matrix
+      A non-negative matrix.
+    method: str
+      'arpack' uses a dense solver for small matrices and ARPACK otherwise, 
+      the eigenvalue is nan if it cannot be computed.
+      'power' uses the power iteration and stops when the estimate is stable within `tol`.
+      'collatz' uses the power iteration and stops when the Collatz-Wielandt bounds 
+      are within `tol` of each other.
+    tol: float
+      Relative tolerance for 'power' and 'collatz'.
+    max_iter: int
+      Maximum number of iterations for 'power' and 'collatz'.
+
+    Returns
+    -------
+    PerronDiagnostics
+    """
+    n_vertices = adj_matrix.shape[0]
+    if n_vertices==0:
+        return _exact_diagnostics(1.0)
+    
+    if method!='arpack':
+        result = _perron_root_by_components(adj_matrix, method=='collatz', tol, max_iter)
+        if not result.converged:
+            logger.warning(f"the {method} iteration did not converge on a matrix with {n_vertices} vertices: {result}")
+        return result
+    
+    if n_vertices<_DENSE_LIMIT:
+        return PerronDiagnostics(float64(npabs(npeigvals(adj_matrix.toarray())).max()), npnan, npnan, 0, True)
+    try:
+        evals = eigs(adj_matrix, k=1, which='LM', tol=1e-12, maxiter=20*n_vertices, return_eigenvectors=False)
+    except ArpackNoConvergence as err:
+        if len(err.eigenvalues)==0:
+            logger.error(f"ARPACK did not converge on a matrix with {n_vertices} vertices")
+            return PerronDiagnostics(npnan, npnan, npnan, 0, False)
+        return PerronDiagnostics(float64(npabs(err.eigenvalues).max()), npnan, npnan, 0, False)
+    except ArpackError as err:
+        logger.error(f"ARPACK failed on a matrix with {n_vertices} vertices: {err}")
+        return PerronDiagnostics(npnan, npnan, npnan, 0, False)
+    return PerronDiagnostics(float64(npabs(evals).max()), npnan, npnan, 0, True)
+
+def _integer_core_entropy(num:int, den:int, method:str='arpack', tol:float=1e-12, max_iter:int=10000)->PerronDiagnostics:
+    """
+    Core entropy of num/den (in lowest terms, different from 0 and 1/2) computed on 
+    the wedge built with integer arithmetic.
+    """
+    result = _leading_eigenvalue(_critical_wedge_matrix(num, den), method, tol, max_iter)
+    if not result.eigenvalue>=1.0: #the maximum might be attained outside of the reachable part
+        result = _leading_eigenvalue(_wedge_matrix(num, den), method, tol, max_iter)
+    return result
+
+def core_entropy_batch(*, dens:Iterable[int]=None, angles:Iterable=None, method:str='arpack', tol:float=1e-12, max_iter:int=10000)->ndarray:
+    """
+    Calculates the core entropy for a whole family of rational angles.
+    Choose between passing the denominators (dens) or the angles.
+
+    The wedge transition matrix is built with integer arithmetic on the 
+    numerators of the orbit and it is restricted to the vertices reachable
+    from the pairs containing the critical value, which carry the leading 
+    eigenvalue. Each angle in lowest terms is computed only once (using 
+    also that theta and 1-theta have the same core entropy).
+
+    Parameters
+    ----------
+    dens: iterable of int
+      The denominators. All the angles num/den in [0,1) in lowest terms are
+      considered, ordered as in `src.angles.angles_with_denominators`.
+    angles: iterable
+      The rational angles, either as Angle or as pairs (num, den).
+    method: str
+      The eigenvalue solver, see `core_entropy`. Default is 'arpack'.
+    tol: float
+      Relative tolerance for the methods 'power' and 'collatz'.
+    max_iter: int
+      Maximum number of iterations for the methods 'power' and 'collatz'.
+    
+    Returns
+    -------
+    numpy.ndarray
+      The core entropies, in the same order as the angles.
+      The value is nan if the eigenvalue solver failed for that angle.
+
+    Example
+    -------
+    >>> core_entropy_batch(angles=[(1,2),(1,4),Angle(3,14)])
+    array([2.        , 1.69562077, 1.61803399])
+    """
+    if (dens is None) == (angles is None):
+        raise ValueError("Pass either the denominators or the angles")
+    if method not in EIGEN_METHODS:
+        raise ValueError(f"method should be one of {EIGEN_METHODS}")
+
+    if dens is not None:
+        pairs = list(angles_with_denominators(dens))
+    else:
+        pairs = []
+        for angle in angles:
+            if type(angle) is Angle:
+                pairs.append((angle.num, angle.den))
+                continue
+            try:
+                num, den = angle
+            except (TypeError, ValueError):
+                raise ValueError("angles should be of type Angle or pairs of integers") from None
+            if type(num) is not int or type(den) is not int or den<1:
+                raise ValueError("angles should be of type Angle or pairs of integers")
+            pairs.append((num % den, den))
+
+    entropies = npempty(len(pairs), dtype=float64)
+    computed = {}
+    for ind, (num, den) in enumerate(pairs):
+        common = gcd(num, den)
+        num, den = num//common, den//common
+        key = (min(num, den-num), den) #theta and 1-theta have the same core entropy
+        if key not in computed:
+            if 2*num==den:
+                computed[key] = 2.0
+            elif num==0:
+                computed[key] = 1.0
+            else:
+                computed[key] = _integer_core_entropy(*key, method, tol, max_iter).eigenvalue
+            logger.debug(f"{num}/{den}; core entropy {computed[key]}")
+        entropies[ind] = computed[key]
+    return entropies
@@ -1,5 +1,3 @@
-from sympy import Abs
-
 class Neighbor:
 
     __slots__ = 'word','parents','children','val','edges','_hash'
@@ -26,7 +24,7 @@ class Neighbor:
     
     def __eq__(self, other)->bool:
         if not isinstance(other, type(self)): return NotImplemented
-        return Abs(self.val-other.val)<=1e-13
+        return abs(self.val-other.val)<=1e-13
     
     def set_parent(self, elem:str)->None:
         """Set the Neighbor's parent
@@ -2,10 +2,11 @@
 Module that contains functions to generate the parameter spaces
 Mandelbrot set
 Thurston set
+Connectedness locus of the IFS
 """
 import numpy as np
 from numba import njit, prange
-from src.utils import compute_green_MM0, ps, allsequences
+from src.utils import compute_green_MM0, ps, allsequences, classify_neighbor_graph, CANTOR, CONNECTED, UNDECIDED
 
 @njit
 def mandelbrot(c, x_dim = 500, y_dim = 500, max_iter = 100):
@@ -196,4 +197,69 @@ def green_MM0_contour(which:str, level:int, x:np.ndarray, y:np.ndarray)->np.ndar
     if which.lower() not in ['t','b']:
         raise ValueError("Only available options are `t` for Thurston set and `b` for Barnsley set")
     seqs = allsequences(level,[1,0,-1]) if which.lower()=='b' else allsequences(level)
-    return compute_green_MM0(ps(1/(x+y*1j),seqs),level)
\ No newline at end of file
+    return compute_green_MM0(ps(1/(x+y*1j),seqs),level)
+
+@njit(parallel=True)
+def _connectedness_rows(c:np.ndarray, max_depth:int, max_vertices:int, tol:float, table_size:int)->np.ndarray:
+    """
+    Runs `classify_neighbor_graph` on every parameter, in parallel over the rows.
+    The buffers are allocated once per row.
+    """
+    y_dim, x_dim = c.shape
+    cntr = np.empty((y_dim, x_dim), dtype=np.int8)
+    for y in prange(y_dim):
+        vals = np.empty(max_vertices, dtype=np.complex128)
+        children = np.empty((max_vertices,3), dtype=np.int64)
+        frontier = np.empty(max_vertices, dtype=np.int64)
+        next_frontier = np.empty(max_vertices, dtype=np.int64)
+        used_slots = np.empty(max_vertices, dtype=np.int64)
+        slot_ix = np.empty(table_size, dtype=np.int64)
+        slot_iy = np.empty(table_size, dtype=np.int64)
+        slot_vertex = -np.ones(table_size, dtype=np.int64)
+        for x in range(x_dim):
+            cntr[y,x] = classify_neighbor_graph(c[y,x], max_depth, tol, vals, children, frontier, next_frontier,
+                                                slot_ix, slot_iy, slot_vertex, used_slots)
+    return cntr
+
+def connectedness_locus(c:np.ndarray, max_depth:int = 20, *, max_vertices:int = 4096, tol:float = 1e-12)->np.ndarray:
+    """
+    Decides for every parameter in the grid whether the attractor of the IFS
+    {cz+1, cz-1} is connected or a Cantor set, using the Neighbor graph.
+
+    For each parameter the graph is grown from the frontier one depth at a time 
+    with complex128 arithmetic (see `src.utils.classify_neighbor_graph`), 
+    and the rows of the grid are processed in parallel.
+
+    Parameters
+    ----------
+    c: numpy.ndarray
+        2-D array representing the parameter plane, as for `mandelbrot`.
+    max_depth: int
+        The maximum depth of the Neighbor graph, as in `src.functions.neighbor_graph`.
+    max_vertices: int
+        Optional. The maximum number of vertices of the graph, after which the 
+        parameter is undecided. Default is 4096.
+    tol: float
+        Optional. Two Neighbors closer than `tol` are the same vertex. Default is 1e-12.
+
+    Returns
+    -------
+    cntr: numpy.ndarray
+        array of int8 with values CONNECTED, CANTOR or UNDECIDED (from `src.utils`).
+        Parameters outside the open unit disk are UNDECIDED.
+
+    Example
+    -------
+    >>> x, y = np.meshgrid(np.linspace(0,1,2000), np.linspace(0,1,2000))
+    >>> locus = connectedness_locus(x+1j*y, 30)
+    >>> plt.imshow(locus==CONNECTED, origin='lower')
+    """
+    c = np.asarray(c, dtype=np.complex128)
+    if c.ndim!=2:
+        raise ValueError("The parameters should be a 2-D array")
+    if type(max_depth) is not int or type(max_vertices) is not int or max_vertices<2:
+        raise ValueError("The maximum depth and the maximum number of vertices should be integer values")
+    table_size = 1
+    while table_size<4*max_vertices:
+        table_size *= 2
+    return _connectedness_rows(np.ascontiguousarray(c), max_depth, max_vertices, tol, table_size)
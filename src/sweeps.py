@@ -0,0 +1,159 @@
+"""
+Module that contains drivers to sweep over families of rational angles
+using a pool of processes
+"""
+from os import path, cpu_count
+from typing import Iterable, Iterator
+from itertools import islice
+from collections import deque
+from fractions import Fraction as Frac
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from numpy import ndarray
+from numpy import nan as npnan
+from numpy import full as npfull
+
+from src.angles import angles_with_denominators
+from src.functions import core_entropy_batch
+
+import logging
+import logging.config
+
+src_dir, _ = path.split(path.abspath(__file__))
+log_conf_path = path.join(path.dirname(src_dir),'log/logging.conf')
+logging.config.fileConfig(log_conf_path)
+
+# create logger
+logger = logging.getLogger("default")
+
+
+def _chunked(iterable:Iterable, chunk_size:int)->Iterator[list]:
+    """
+    Splits an iterable in lists of at most `chunk_size` elements.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunk_size))
+
+def _entropy_chunk(chunk:list)->ndarray:
+    """
+    Computes the core entropy of a chunk of angles inside a worker.
+    If the batch fails, it falls back to one angle at a time so that
+    only the failing angles are set to nan.
+
+    Parameters
+    ----------
+    chunk: list
+        The angles as pairs (num, den).
+
+    Return
+    ------
+    numpy.ndarray
+        The core entropies.
+    """
+    try:
+        return core_entropy_batch(angles=chunk)
+    except Exception as err:
+        logger.error(f"chunk starting at {chunk[0][0]}/{chunk[0][1]} failed ({err!r}), computing one angle at a time")
+
+    entropies = npfull(len(chunk), npnan)
+    for ind, angle in enumerate(chunk):
+        try:
+            entropies[ind] = core_entropy_batch(angles=[angle])[0]
+        except Exception as err:
+            logger.error(f"{angle[0]}/{angle[1]}; could not compute the core entropy ({err!r})")
+    return entropies
+
+def core_entropy_sweep(dens:Iterable[int], *, max_workers:int=None, chunk_size:int=256, max_retries:int=1)->Iterator[tuple]:
+    """
+    Computes the core entropy of all the rational angles in lowest terms with
+    the given denominators, splitting the work in chunks over a pool of processes.
+
+    The results are streamed back in the same order as
+    `src.angles.angles_with_denominators`. Only a bounded number of chunks
+    is in flight at any time, so the sweep can be consumed lazily.
+
+    If a worker crashes, the pool is restarted and the chunk at the head of
+    the queue is run on its own, so that the chunk responsible for the crash
+    is found. If it crashes again it is retried `max_retries` times and then 
+    its entropies are set to nan; the rest of the sweep is not lost.
+    Angles for which the eigenvalue solver fails are also set to nan.
+
+    Parameters
+    ----------
+    dens: iterable of int
+        The denominators.
+    max_workers: int
+        Optional. The number of processes. Default is the number of CPUs.
+    chunk_size: int
+        Optional. The number of angles sent to a worker at once. Default is 256.
+    max_retries: int
+        Optional. How many times a chunk that crashed a worker is retried. Default is 1.
+
+    Return
+    ------
+    iterator of tuple
+        Pairs `(angle, entropy)` where angle is a fractions.Fraction and entropy a float.
+
+    Example
+    -------
+    >>> for angle, entropy in core_entropy_sweep(range(1,4)):
+    ...     print(angle, entropy)
+    0 1.0
+    1/2 2.0
+    1/3 1.0
+    2/3 1.0
+    """
+    if type(chunk_size) is not int or chunk_size<1:
+        raise ValueError("The chunk size should be a positive integer")
+
+    chunks = _chunked(angles_with_denominators(dens), chunk_size)
+    workers = max_workers if max_workers else (cpu_count() or 1)
+    window = 2*workers
+    pending = deque() # entries are [chunk, future]
+    #spawn the workers, forking a process that already runs numba threads can deadlock
+    context = get_context("spawn")
+    executor = ProcessPoolExecutor(workers, mp_context=context)
+
+    def restart():
+        nonlocal executor
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = ProcessPoolExecutor(workers, mp_context=context)
+
+    def fill():
+        for chunk in islice(chunks, window-len(pending)):
+            pending.append([chunk, executor.submit(_entropy_chunk, chunk)])
+
+    try:
+        fill()
+        while pending:
+            chunk, future = pending.popleft()
+            try:
+                entropies = future.result()
+            except BrokenProcessPool:
+                logger.error(f"a worker crashed, restarting the pool and isolating the chunk starting at {chunk[0][0]}/{chunk[0][1]}")
+                restart()
+                #run the head of the queue alone to find out whether it is responsible
+                entropies = None
+                crashes = 0
+                while entropies is None:
+                    try:
+                        entropies = executor.submit(_entropy_chunk, chunk).result()
+                    except BrokenProcessPool:
+                        restart()
+                        crashes += 1
+                        if crashes>max_retries:
+                            logger.error(f"the chunk starting at {chunk[0][0]}/{chunk[0][1]} crashed a worker {crashes} times, its entropies are set to nan")
+                            entropies = npfull(len(chunk), npnan)
+                for entry in pending:
+                    entry[1] = executor.submit(_entropy_chunk, entry[0])
+
+            fill()
+            for (num, den), entropy in zip(chunk, entropies):
+                yield (Frac(num, den), float(entropy))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -18,7 +18,7 @@ logging.config.fileConfig(log_conf_path)
 # create logger
 logger = logging.getLogger("default")
 
-def is_child_neighbor(test_nbh:Neighbor, valid_nbhs:set, param:complex)->tuple:
+def is_child_neighbor(test_nbh:Neighbor, valid_nbhs:set, param:complex, is_inside:bool=None)->tuple:
     """
     Checks whether the Neighbor is a child Neighbor.
     
@@ -30,6 +30,9 @@ def is_child_neighbor(test_nbh:Neighbor, valid_nbhs:set, param:complex)->tuple:
         the set of valid Neighbors
     param: complex
         the parameter
+    is_inside: bool
+        Optional. Whether test_nbh is inside the disk of radius 2/(1-|param|), 
+        if it has already been computed. Default is None.
     
     Return
     ------
@@ -43,17 +46,19 @@ def is_child_neighbor(test_nbh:Neighbor, valid_nbhs:set, param:complex)->tuple:
     err = 1e-29
     prec = 30
     
-    critical_rad = (2*(1-Abs(param))**(-1)).evalf(prec) #the escape radius
     is_new = test_nbh not in valid_nbhs
     
     if is_new: # test_nbh is POSSIBLY a new vertex
         logger.debug(f"{param:.5f};\t {test_nbh.word} is POSSIBLY a new neighbor")
-        h_val = Abs(test_nbh.val)
-        if h_val.evalf(prec)<=critical_rad or Abs(h_val-critical_rad).evalf(prec)<=err:
+        if is_inside is None:
+            critical_rad = (2*(1-Abs(param))**(-1)).evalf(prec) #the escape radius
+            h_val = Abs(test_nbh.val)
+            is_inside = h_val.evalf(prec)<=critical_rad or Abs(h_val-critical_rad).evalf(prec)<=err
+        if is_inside:
             logger.debug(f"{param:.5f};\t {test_nbh.word} IS a child vertex\n")
             is_child = True # test_nbh IS a child vertex
         else: # phi_Star is NOT a VALID neighbor 
-            logger.debug(f"{param:.5f};\t {test_nbh.word} is NOT a new neighbor:\n\t\t {h_val=} {critical_rad=}\n")
+            logger.debug(f"{param:.5f};\t {test_nbh.word} is NOT a new neighbor:\n\t\t |h|={abs(test_nbh.val)}\n")
             is_child = False
     else: # phi_Star ALREADY EXISTS
         logger.debug(f"{param:.5f}; \t {test_nbh.word} ALREADY EXISTS\n")
@@ -126,7 +131,8 @@ def check_neighbor(test_nbh:Neighbor,
                    valid_nbhs:set,
                    children:set,
                    nbh_lookup:dict,
-                   param:complex)->bool:
+                   param:complex,
+                   is_inside:bool=None)->bool:
     """
     Paramteres
     ----------
@@ -145,19 +151,68 @@ def check_neighbor(test_nbh:Neighbor,
         It uses the Neighbor hash as the key and the Neighbor word as the value
     param: complex
         The comple parameter that is being used.
+    is_inside: bool
+        Optional. Whether test_nbh is inside the disk of radius 2/(1-|param|), 
+        if it has already been computed. Default is None.
 
     Return
     ------
     is_child : bool
     """
-    is_new, is_child = is_child_neighbor(test_nbh,valid_nbhs,param)
+    is_new, is_child = is_child_neighbor(test_nbh,valid_nbhs,param,is_inside)
     if is_new and is_child:
         add_new_child(test_nbh,curr_nbh,edge,children,valid_nbhs,nbh_lookup) 
     elif not is_new: 
         update_lookup(test_nbh,curr_nbh,edge,valid_nbhs,nbh_lookup,False)
     return is_child
 
-def nbhG(param:complex, max_depth:int)->tuple:
+# available backends for the arithmetic in the Neighbor graph
+NBH_BACKENDS = ('sympy','numpy','numba')
+
+def child_values_numpy(vals:np.ndarray, param:complex, critical_rad:float)->tuple:
+    """
+    Computes the three possible children of each Neighbor value, in the
+    order phi_Star, phi_PM, phi_MP, and whether they lie inside the closed disk 
+    of radius `critical_rad`. As in the SymPy path, no tolerance is added to
+    the radius.
+
+    Parameters
+    ----------
+    vals: numpy.ndarray
+        The values of the Neighbors, as complex128.
+    param: complex
+        The parameter.
+    critical_rad: float
+        The escape radius 2/(1-|param|).
+
+    Return
+    ------
+    tuple of numpy.ndarray
+        The (n,3) array of children values and the (n,3) boolean array.
+    """
+    children = np.empty((len(vals),3), dtype=np.complex128)
+    children[:,0] = vals/param
+    children[:,1] = (vals-2)/param
+    children[:,2] = (vals+2)/param
+    return children, np.abs(children)<=critical_rad
+
+@njit
+def child_values_numba(vals:np.ndarray, param:complex, critical_rad:float)->tuple:
+    """
+    Compiled version of `child_values_numpy`.
+    """
+    children = np.empty((len(vals),3), dtype=np.complex128)
+    inside = np.empty((len(vals),3), dtype=np.bool_)
+    inv_param = 1/param
+    for i in range(len(vals)):
+        children[i,0] = vals[i]*inv_param
+        children[i,1] = (vals[i]-2)*inv_param
+        children[i,2] = (vals[i]+2)*inv_param
+        for k in range(3):
+            inside[i,k] = np.abs(children[i,k])<=critical_rad
+    return children, inside
+
+def nbhG(param:complex, max_depth:int, *, backend:str='sympy')->tuple:
     """
     Finds the edges in the Neighbor graph for
     the parameter z.
@@ -170,6 +225,10 @@ def nbhG(param:complex, max_depth:int)->tuple:
         the complex parameter to check
     maxDepth: int
         maximum depth
+    backend: str
+        Optional. How to compute the values of the Neighbors: 'sympy' evaluates
+        SymPy expressions with 30 digits, 'numpy' and 'numba' use complex128
+        arithmetic on the whole frontier at once. Default is 'sympy'.
     
     Return
     ------
@@ -180,28 +239,38 @@ def nbhG(param:complex, max_depth:int)->tuple:
         It uses the Neighbor hash as the key and the Neighbor word as the value
     """
 
-    z = Symbol('z')
-    phi_PM = Function('phiPM')(z)
-    phi_MP = Function('phiMP')(z)
-    phi_Star = Function('phiStar')(z)
-    
-    phi_PM = (z-2)*param**(-1)# corresponds to fp^(-1) g fm
-    phi_MP = (z+2)*param**(-1)# corresponds to fm^(-1) g fp
-    phi_Star = z*param**(-1)# corresponds to fpm^(-1) g fpm
+    if backend not in NBH_BACKENDS:
+        raise ValueError(f"backend should be one of {NBH_BACKENDS}")
+
+    if backend=='sympy':
+        z = Symbol('z')
+        phi_PM = Function('phiPM')(z)
+        phi_MP = Function('phiMP')(z)
+        phi_Star = Function('phiStar')(z)
         
-    prec = 30
+        phi_PM = (z-2)*param**(-1)# corresponds to fp^(-1) g fm
+        phi_MP = (z+2)*param**(-1)# corresponds to fm^(-1) g fp
+        phi_Star = z*param**(-1)# corresponds to fpm^(-1) g fpm
+            
+        prec = 30
+        first_val = phi_MP.evalf(prec,subs={z:0})
+    else:
+        param = complex(param)
+        first_val = 2/param
+        critical_rad = 2/(1-abs(param)) #the escape radius
+        child_values = child_values_numba if backend=='numba' else child_values_numpy
     
     #initialize the set of Neighbors in the graph
     valid_neighbors = set([
         Neighbor('.',0.+0.j,children=['+'],edges=['mp']),
-        Neighbor('+',phi_MP.evalf(prec,subs={z:0}),parents=['.'])
+        Neighbor('+',first_val,parents=['.'])
     ])
     
     #initialize the dictionary of current Neighbors 
     nbh_lookup = {elem._hash:elem.word for elem in valid_neighbors}
     
     #initialize the set of new Neighbors at the current stage
-    new_neighbors = set([Neighbor('+',phi_MP.evalf(prec,subs={z:0}),parents=['.'])])
+    new_neighbors = set([Neighbor('+',first_val,parents=['.'])])
     
     depth = 1
     
@@ -213,19 +282,27 @@ def nbhG(param:complex, max_depth:int)->tuple:
         is_child_Star = False
         is_child_PM = False
         is_child_MP = False
+
+        #compute the possible new Neighbors of the whole frontier
+        frontier = list(new_neighbors)
+        if backend=='sympy':
+            children_vals = [(phi_Star.evalf(prec,subs={z:nbh.val}),
+                              phi_PM.evalf(prec,subs={z:nbh.val}),
+                              phi_MP.evalf(prec,subs={z:nbh.val})) for nbh in frontier]
+            children_inside = [(None,None,None)]*len(frontier)
+        else:
+            children_vals, children_inside = child_values(np.array([nbh.val for nbh in frontier],dtype=np.complex128),param,critical_rad)
         
-        for current_nbh in new_neighbors:
+        for current_nbh, (val_Star, val_PM, val_MP), (in_Star, in_PM, in_MP) in zip(frontier, children_vals, children_inside):
             current_word = current_nbh.word
-            current_val = current_nbh.val
             
-            #compute the possible new Neighbors
-            h_Star = Neighbor(current_word+'0',phi_Star.evalf(prec,subs={z:current_val}),parents=[current_word])
-            h_PM = Neighbor(current_word+'-',phi_PM.evalf(prec,subs={z:current_val}),parents=[current_word])
-            h_MP = Neighbor(current_word+'+',phi_MP.evalf(prec,subs={z:current_val}),parents=[current_word])
+            h_Star = Neighbor(current_word+'0',val_Star,parents=[current_word])
+            h_PM = Neighbor(current_word+'-',val_PM,parents=[current_word])
+            h_MP = Neighbor(current_word+'+',val_MP,parents=[current_word])
             
-            is_child_Star = check_neighbor(h_Star,current_nbh,'*',valid_neighbors,new_children,nbh_lookup,param)
-            is_child_PM = check_neighbor(h_PM,current_nbh,'pm',valid_neighbors,new_children,nbh_lookup,param)
-            is_child_MP = check_neighbor(h_MP,current_nbh,'mp',valid_neighbors,new_children,nbh_lookup,param)
+            is_child_Star = check_neighbor(h_Star,current_nbh,'*',valid_neighbors,new_children,nbh_lookup,param,in_Star)
+            is_child_PM = check_neighbor(h_PM,current_nbh,'pm',valid_neighbors,new_children,nbh_lookup,param,in_PM)
+            is_child_MP = check_neighbor(h_MP,current_nbh,'mp',valid_neighbors,new_children,nbh_lookup,param,in_MP)
                 
             #in the case that all the computed neighbors are not valid
             #save the current Neighbor in a list 
@@ -406,4 +483,260 @@ def compare(sequence:list, s_list:list)->bool:
             continue
         else:
             return False
-    return True
\ No newline at end of file
+    return True
+@njit
+def perron_root(indptr:np.ndarray, indices:np.ndarray, data:np.ndarray, tol:float, max_iter:int, use_bounds:bool)->tuple:
+    r"""Power iteration for the leading eigenvalue of an irreducible non-negative 
+    matrix given in CSR format.
+
+    It iterates the shifted matrix :math:`B = A + I`, which has the same 
+    eigenvectors as `A` and a strictly dominant Perron root even when `A` is 
+    not primitive. At each step it computes the Collatz-Wielandt bounds
+    .. math:: \min_i \frac{(Bx)_i}{x_i} \le \rho(B) \le \max_i \frac{(Bx)_i}{x_i}
+    
+    Parameters
+    ----------
+    indptr: numpy.ndarray
+        The CSR row pointers.
+    indices: numpy.ndarray
+        The CSR column indices.
+    data: numpy.ndarray
+        The CSR non-negative entries.
+    tol: float
+        Relative tolerance.
+    max_iter: int
+        Maximum number of iterations.
+    use_bounds: bool
+        If True, stop when the gap between the bounds is within `tol`, otherwise
+        stop when the (normalized) iterate changes less than `tol`.
+    
+    Return
+    ------
+    tuple
+        (estimate, lower, upper, iterations, converged) for the leading eigenvalue of `A`.
+    """
+    n = len(indptr)-1
+    x = np.ones(n)
+    y = np.empty(n)
+    estimate = 0.
+    lower = 0.
+    upper = np.inf
+    converged = False
+    it = 0
+    while it<max_iter and not converged:
+        it += 1
+        for i in range(n):
+            s = x[i]
+            for k in range(indptr[i], indptr[i+1]):
+                s += data[k]*x[indices[k]]
+            y[i] = s
+        
+        lower = np.inf
+        upper = 0.
+        for i in range(n):
+            if x[i]==0.:
+                lower = 0.
+                upper = np.inf
+                break
+            lower = min(lower, y[i]/x[i])
+            upper = max(upper, y[i]/x[i])
+        estimate = np.sum(y)/np.sum(x)
+        
+        y_max = np.max(y)
+        change = 0.
+        for i in range(n):
+            change = max(change, abs(y[i]/y_max-x[i]))
+            x[i] = y[i]/y_max
+
+        if use_bounds:
+            converged = upper-lower <= tol*upper
+        else:
+            converged = change <= tol
+    return (estimate-1., lower-1., upper-1., it, converged)
+
+# classification of the attractor from its Neighbor graph
+CANTOR = 0
+CONNECTED = 1
+UNDECIDED = 2
+
+@njit
+def _cell_slot(ix:int, iy:int, mask:int)->int:
+    """
+    Starting slot in the hash table for the cell (ix,iy).
+    """
+    return ((ix*73856093) ^ (iy*19349663)) & mask
+
+@njit
+def _probe_range(coord:float, cell:float, tol:float)->tuple:
+    """
+    Cells, along one axis, that intersect the interval of radius `tol` around `coord`.
+    """
+    ic = np.int64(np.floor(coord/cell))
+    offset = coord-ic*cell
+    return ic, (-1 if offset<tol else 0), (1 if cell-offset<tol else 0)
+
+@njit
+def _find_or_insert(val:complex, tol:float, n_vertices:int, vals:np.ndarray,
+                    slot_ix:np.ndarray, slot_iy:np.ndarray, slot_vertex:np.ndarray, used_slots:np.ndarray)->int:
+    """
+    Looks for a vertex whose value is within `tol` of `val`. The vertices are 
+    bucketed in square cells of side 1e6*tol, so usually only the cell of `val` 
+    is probed, and the neighbouring cells only when `val` is within `tol` of 
+    their border. If there is no such vertex, `val` is inserted as vertex `n_vertices`.
+
+    Return
+    ------
+    int
+        The index of the vertex. It is equal to `n_vertices` if the vertex is new.
+    """
+    mask = len(slot_vertex)-1
+    cell = 16*tol
+    ix, x_lo, x_hi = _probe_range(val.real, cell, tol)
+    iy, y_lo, y_hi = _probe_range(val.imag, cell, tol)
+    for dx in range(x_lo, x_hi+1):
+        for dy in range(y_lo, y_hi+1):
+            slot = _cell_slot(ix+dx, iy+dy, mask)
+            while slot_vertex[slot]>=0:
+                if slot_ix[slot]==ix+dx and slot_iy[slot]==iy+dy and np.abs(vals[slot_vertex[slot]]-val)<=tol:
+                    return slot_vertex[slot]
+                slot = (slot+1) & mask
+    slot = _cell_slot(ix, iy, mask)
+    while slot_vertex[slot]>=0:
+        slot = (slot+1) & mask
+    slot_ix[slot] = ix
+    slot_iy[slot] = iy
+    slot_vertex[slot] = n_vertices
+    used_slots[n_vertices] = slot
+    vals[n_vertices] = val
+    return n_vertices
+
+@njit
+def _has_cycle(n_vertices:int, children:np.ndarray)->bool:
+    """
+    Checks whether the graph on the first `n_vertices` vertices has a cycle
+    by removing, until none is left, the vertices without children.
+    """
+    out_degree = np.zeros(n_vertices, dtype=np.int64)
+    n_parents = np.zeros(n_vertices+1, dtype=np.int64)
+    for v in range(n_vertices):
+        for k in range(3):
+            if children[v,k]>=0:
+                out_degree[v] += 1
+                n_parents[children[v,k]+1] += 1
+    parents_ptr = np.cumsum(n_parents)
+    parents = np.empty(parents_ptr[-1], dtype=np.int64)
+    fill = parents_ptr[:-1].copy()
+    for v in range(n_vertices):
+        for k in range(3):
+            w = children[v,k]
+            if w>=0:
+                parents[fill[w]] = v
+                fill[w] += 1
+
+    queue = np.empty(n_vertices, dtype=np.int64)
+    n_queue = 0
+    for v in range(n_vertices):
+        if out_degree[v]==0:
+            queue[n_queue] = v
+            n_queue += 1
+    removed = 0
+    while removed<n_queue:
+        w = queue[removed]
+        removed += 1
+        for p in range(parents_ptr[w], parents_ptr[w+1]):
+            v = parents[p]
+            out_degree[v] -= 1
+            if out_degree[v]==0:
+                queue[n_queue] = v
+                n_queue += 1
+    return n_queue<n_vertices
+
+@njit
+def classify_neighbor_graph(param:complex, max_depth:int, tol:float, vals:np.ndarray, children:np.ndarray,
+                            frontier:np.ndarray, next_frontier:np.ndarray, 
+                            slot_ix:np.ndarray, slot_iy:np.ndarray, slot_vertex:np.ndarray, used_slots:np.ndarray)->int:
+    """
+    Decides whether the attractor for `param` is connected or a Cantor set by 
+    growing its Neighbor graph one depth at a time, as `nbhG` does, with 
+    complex128 arithmetic.
+
+    A cycle in the graph gives an infinite path, so the attractor is connected.
+    If the frontier dies out without cycles, the attractor is a Cantor set.
+    Otherwise, when `max_depth` is reached or the buffers are full, it is undecided.
+
+    The buffers are allocated by the caller, so that they can be reused across
+    parameters. Their length is the maximum number of vertices, the hash table
+    (`slot_ix`, `slot_iy`, `slot_vertex`) has a power of 2 length larger than that
+    and `slot_vertex` must be all -1.
+
+    Return
+    ------
+    int
+        One of CANTOR, CONNECTED and UNDECIDED.
+    """
+    abs_param = np.abs(param)
+    if abs_param<0.5:
+        return CANTOR
+    if abs_param>=1.:
+        return UNDECIDED
+    critical_rad = 2/(1-abs_param)
+    max_vertices = len(vals)
+    inv_param = 1/param
+    
+    #the identity and its child h+
+    n_vertices = 0
+    for val in (0j, 2*inv_param):
+        n_vertices = _find_or_insert(val, tol, n_vertices, vals, slot_ix, slot_iy, slot_vertex, used_slots)+1
+    children[:2] = -1
+    children[0,0] = 1
+    frontier[0] = 1
+    n_frontier = 1
+
+    result = UNDECIDED
+    depth = 1
+    while depth<max_depth:
+        n_next = 0
+        full = False
+        closed_edge = False #only an edge to an existing vertex can close a cycle
+        for f in range(n_frontier):
+            v = frontier[f]
+            for k in range(3):
+                if k==0:
+                    child_val = vals[v]*inv_param
+                elif k==1:
+                    child_val = (vals[v]-2)*inv_param
+                else:
+                    child_val = (vals[v]+2)*inv_param
+                if np.abs(child_val)>critical_rad:
+                    continue
+                if n_vertices==max_vertices:
+                    full = True
+                    break
+                w = _find_or_insert(child_val, tol, n_vertices, vals, slot_ix, slot_iy, slot_vertex, used_slots)
+                if w==n_vertices:
+                    children[w] = -1
+                    next_frontier[n_next] = w
+                    n_next += 1
+                    n_vertices += 1
+                else:
+                    closed_edge = True
+                children[v,k] = w
+            if full:
+                break
+        
+        if closed_edge and _has_cycle(n_vertices, children):
+            result = CONNECTED
+            break
+        if full:
+            break
+        if n_next==0:
+            result = CANTOR
+            break
+        frontier[:n_next] = next_frontier[:n_next]
+        n_frontier = n_next
+        depth += 1
+    
+    #reset the hash table for the next parameter
+    for v in range(n_vertices):
+        slot_vertex[used_slots[v]] = -1
+    return result
@@ -1,6 +1,7 @@
-from src.functions import core_entropy, neighbor_graph
+from src.functions import core_entropy, core_entropy_batch, neighbor_graph, PerronDiagnostics
 from src.angles import Angle
 from pytest import approx, raises, mark
+from math import gcd
 
 @mark.parametrize("test_num_exact,test_den_exact,expected",[
     (0,1,1.0),
@@ -27,6 +28,41 @@ def test_core_entropy_approx(test_num_approx,test_den_approx,expected):
 
     assert core_entropy(num=test_num_approx,den=test_den_approx) == approx(expected)
 
+@mark.parametrize("test_method",["power","collatz"])
+@mark.parametrize("test_num_approx,test_den_approx,expected",[
+    (1,4,1.69562),
+    (2,7,1.0),
+    (1,5,1.3953369),
+    (3,14,1.6180339),
+    (1,7,1.0)
+    ],ids=["1/4","2/7","1/5","3/14","1/7"])
+def test_core_entropy_methods(test_num_approx,test_den_approx,test_method,expected):
+    """
+    check that the power iteration solvers return (approximately) correct values
+    """
+
+    assert core_entropy(num=test_num_approx,den=test_den_approx,method=test_method) == approx(expected)
+
+def test_core_entropy_diagnostics():
+    """
+    check that the Collatz-Wielandt bounds enclose the core entropy
+    """
+    result = core_entropy(num=3,den=14,method="collatz",tol=1e-10,diagnostics=True)
+
+    assert type(result) is PerronDiagnostics
+    assert result.converged
+    assert result.lower <= (1+5**0.5)/2 <= result.upper
+    assert result.upper-result.lower <= 1e-9
+    assert core_entropy(num=1,den=2,method="power",diagnostics=True) == PerronDiagnostics(2.0,2.0,2.0,0,True)
+
+def test_core_entropy_method_ValueError():
+    """
+    check that the core_entropy raises ValueError for unknown methods
+    """
+
+    with raises(ValueError): 
+        core_entropy(num=1,den=4,method="lanczos")
+
 @mark.parametrize("test_angle_exact,expected",[
     (Angle(1,2),2.0),
     (Angle(th="2/7"),1.0),
@@ -75,6 +111,45 @@ def test_core_entropy_angle_ValueErrors(test_angle):
         core_entropy(angle=test_angle)
 
 
+def test_core_entropy_batch_angles():
+    """
+    check that core_entropy_batch agrees with core_entropy
+    """
+    test_angles = [(0,1),(1,2),(1,4),(2,7),(1,5),(3,14),Angle(11,62),(3,4)]
+    expected = [core_entropy(num=a[0],den=a[1]) if type(a) is tuple else core_entropy(angle=a) for a in test_angles]
+
+    assert core_entropy_batch(angles=test_angles) == approx(expected)
+
+def test_core_entropy_batch_dens():
+    """
+    check that core_entropy_batch sweeps the angles in lowest terms with the given denominators
+    """
+    entropies = core_entropy_batch(dens=range(1,9))
+    expected = core_entropy_batch(angles=[(n,d) for d in range(1,9) for n in range(d) if gcd(n,d)==1])
+
+    assert len(entropies) == 22
+    assert entropies == approx(expected)
+    assert entropies[:4] == approx([1.0, 2.0, 1.0, 1.0])
+    assert core_entropy_batch(dens=range(1,9),method="collatz") == approx(expected)
+
+@mark.parametrize("test_kwargs",[
+    {},
+    {"dens":[1,2],"angles":[(1,2)]},
+    {"angles":[(1.0,2)]},
+    {"angles":["1/2"]},
+    {"dens":[0]},
+    {"dens":[2.0]},
+    {"dens":[2],"method":"lanczos"}
+    ],ids=["none","both","float","str","zero den","float den","method"])
+def test_core_entropy_batch_ValueErrors(test_kwargs):
+    """
+    check that core_entropy_batch raises ValueError for not allowed input
+    """
+
+    with raises(ValueError): 
+        core_entropy_batch(**test_kwargs)
+
+
 lambdas = [
     (0.25+0.15*1j,"disconnected"),
     (0.5**(0.5)*(1+1j),"on the unit disk"),
@@ -127,14 +202,15 @@ expected_nbhg = [
     }
 
 ]
+@mark.parametrize("test_backend",["sympy","numpy","numba"])
 @mark.parametrize("test_param,test_depth,expected",
                   [(lam[0],8,ex_ang) for lam, ex_ang in zip(lambdas,expected_nbhg)],
                   ids=[lam[1] for lam in lambdas])
-def test_neighbor_graph(test_param,test_depth,expected):
+def test_neighbor_graph(test_param,test_depth,test_backend,expected):
     """
     check it creates the correct neighbor graph
     """
-    test_nbh = neighbor_graph(test_param,test_depth)
+    test_nbh = neighbor_graph(test_param,test_depth,backend=test_backend)
     assert test_nbh == expected
 
 @mark.parametrize("test_param,test_depth",
@@ -151,3 +227,11 @@ def test_neighbor_graph_ValueError(test_param,test_depth):
     
     with raises(ValueError): 
         neighbor_graph(test_param,test_depth)
+
+def test_neighbor_graph_backend_ValueError():
+    """
+    check that the neighbor_graph raises ValueError for unknown backends
+    """
+    
+    with raises(ValueError): 
+        neighbor_graph(0.5,8,backend="mpmath")
@@ -0,0 +1,38 @@
+from src.parameter_spaces import connectedness_locus
+from src.utils import CANTOR, CONNECTED, UNDECIDED
+from pytest import raises, mark
+import numpy as np
+
+params = [
+    (0.25+0.15*1j,CANTOR,"disconnected"),
+    (0.5**(0.5)*(1+1j),UNDECIDED,"on the unit disk"),
+    (0.5+0.*1j,CONNECTED,"1/2"),
+    (0.366875964264129394095471688839696517595563618765593247116005 + 0.520259438865200828930723528940227115174924275956965606630538*1j,CONNECTED,"3/14"),
+    (0.595743941976559373530677134113758646737345510937144045504891 + 0.254425889416368995243211219643495532619603711040766445706284*1j,CONNECTED,"3/8"),
+    (0.102784715200295155851014308891911713188554459798849720235276 + 0.665456951152813476706190611629077711878015849981853233566949*1j,CONNECTED,"Kolakoski"),
+    (0.+0.707106781186547524400844362104849039284835937688474036588340*1j,CONNECTED,"A4 paper"),
+    (0.6+0.1*1j,CANTOR,"dies out"),
+    (0.6+0.*1j,UNDECIDED,"real")
+]
+
+def test_connectedness_locus():
+    """
+    check that the Neighbor graph classification agrees with the known parameters
+    """
+    grid = np.array([[p[0] for p in params]]*2)
+    locus = connectedness_locus(grid,20)
+
+    assert locus.shape == grid.shape
+    assert locus.tolist() == [[p[1] for p in params]]*2
+
+@mark.parametrize("test_c,test_depth",[
+    (np.zeros(3,dtype=complex),8),
+    (np.zeros((2,2),dtype=complex),8.0)
+    ],ids=["1-D","float depth"])
+def test_connectedness_locus_ValueError(test_c,test_depth):
+    """
+    check that connectedness_locus raises ValueError for not allowed input
+    """
+
+    with raises(ValueError):
+        connectedness_locus(test_c,test_depth)
@@ -0,0 +1,51 @@
+from src.sweeps import core_entropy_sweep, _entropy_chunk
+from src.functions import core_entropy_batch
+from fractions import Fraction as Frac
+from math import isnan
+from os import _exit
+from pytest import approx, raises, mark
+import src.sweeps
+
+def _crashing_chunk(chunk):
+    """
+    kills the worker whenever the chunk contains the angle 1/2
+    """
+    if (1,2) in chunk:
+        _exit(1)
+    return _entropy_chunk(chunk)
+
+@mark.parametrize("test_workers,test_chunk_size",[
+    (1,1),
+    (2,3),
+    (2,256)
+    ],ids=["1 worker","2 workers","single chunk"])
+def test_core_entropy_sweep(test_workers,test_chunk_size):
+    """
+    check that the sweep streams the same values as core_entropy_batch, in order
+    """
+    results = list(core_entropy_sweep(range(1,16),max_workers=test_workers,chunk_size=test_chunk_size))
+    angles = [angle for angle,_ in results]
+
+    assert angles == [Frac(n,d) for d in range(1,16) for n in range(d) if Frac(n,d).denominator==d]
+    assert [entropy for _,entropy in results] == approx(core_entropy_batch(dens=range(1,16)))
+
+def test_core_entropy_sweep_worker_crash(monkeypatch):
+    """
+    check that a crashing chunk is set to nan without losing the rest of the sweep
+    """
+    monkeypatch.setattr(src.sweeps, "_entropy_chunk", _crashing_chunk)
+    results = list(core_entropy_sweep(range(1,8),max_workers=2,chunk_size=2))
+    expected = core_entropy_batch(dens=range(1,8))
+
+    assert len(results) == len(expected)
+    assert [angle for angle,_ in results[:2]] == [Frac(0,1),Frac(1,2)]
+    assert all(isnan(entropy) for _,entropy in results[:2])
+    assert [entropy for _,entropy in results[2:]] == approx(expected[2:])
+
+def test_core_entropy_sweep_ValueError():
+    """
+    check that the sweep raises ValueError for not allowed chunk sizes
+    """
+
+    with raises(ValueError): 
+        next(core_entropy_sweep(range(1,4),chunk_size=0))